@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+
+def done_future(result=None):
+    """Future ya resuelto para awaits cuyo resultado nunca se inspecciona.
+
+    Usado como `MagicMock(return_value=done_future())`: más liviano que un
+    AsyncMock y se puede await-ear varias veces.
+    """
+    fut = asyncio.get_event_loop().create_future()
+    fut.set_result(result)
+    return fut
+
+
+def failing_then_ok(fail_count, exc, result=None):
+    """Side effect async que falla `fail_count` veces y después devuelve `result`.
+
+    Expone el contador en `.calls` para los tests que afirman cantidades.
+    """
+    async def _side_effect(*args, **kwargs):
+        _side_effect.calls += 1
+        if _side_effect.calls <= fail_count:
+            raise exc
+        return result
+    _side_effect.calls = 0
+    return _side_effect
+
+
+@pytest.fixture
+def fake_page():
+    """Page de Playwright simulada con el cableado tipico ya hecho.
+
+    Los metodos async salen gratis del AsyncMock; locator() y los
+    get_by_* se pisan con MagicMock porque en la API real son
+    sincronicos (devuelven el Locator sin await).
+    """
+    page = AsyncMock()
+    page.locator = MagicMock(return_value=AsyncMock())
+    page.get_by_role = MagicMock(return_value=AsyncMock())
+    page.get_by_placeholder = MagicMock(return_value=AsyncMock())
+    return page
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    """Anula asyncio.sleep en todo el suite: ningún test espera de verdad.
+
+    Devuelve el mock para que los tests de backoff puedan inspeccionar
+    con qué tiempos se llamó.
+    """
+    mock = AsyncMock()
+    monkeypatch.setattr("main.asyncio.sleep", mock)
+    return mock
@@ -1,11 +1,13 @@
 import asyncio
 import base64
 import os
+import random
+from collections import deque
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 from pathlib import Path
 from playwright.async_api import async_playwright
-import resend
+import httpx
 
 URL = "https://www.santafe.gob.ar/seturnosweb/"
 TIMEZONE = ZoneInfo("America/Argentina/Buenos_Aires")
@@ -28,25 +30,136 @@ PERSONAS = [
 ]
 
 RESEND_API_KEY = os.getenv("RESEND_API_KEY")
+# Endpoint del POST que dispara el formulario, capturado con las dev tools en
+# una corrida manual. Si esta configurado se intenta el turno sin navegador.
+API_TURNOS_URL = os.getenv("API_TURNOS_URL")
+# Endpoint JSON del que la SPA saca el max del date picker (capturado igual
+# que API_TURNOS_URL). Si esta configurado, la disponibilidad se pollea con
+# httpx (~KB por consulta) en vez de recargar toda la SPA en Chromium.
+API_FECHAS_URL = os.getenv("API_FECHAS_URL")
+RESEND_API_URL = "https://api.resend.com"
+
+# Cliente HTTP/2 compartido contra Resend: un solo handshake TLS amortizado
+# entre todos los envios, en vez de una conexion nueva por email.
+_resend_client = None
+
+
+def _obtener_cliente_resend():
+    global _resend_client
+    if _resend_client is None:
+        _resend_client = httpx.AsyncClient(
+            base_url=RESEND_API_URL,
+            http2=True,
+            headers={"Authorization": f"Bearer {RESEND_API_KEY}"},
+            timeout=30,
+        )
+    return _resend_client
+
+
+async def cerrar_cliente_resend():
+    global _resend_client
+    if _resend_client is not None:
+        await _resend_client.aclose()
+        _resend_client = None
 EMAIL_DESTINATARIO = os.getenv("EMAIL_DESTINATARIO")
 MODO_TEST = os.getenv("MODO_TEST", "false").lower() == "true"
+# Leida una sola vez al importar: el valor no cambia durante la corrida y
+# asi no se toca el entorno en el camino critico.
+_HORA_OBJETIVO_RAW = os.getenv("HORA_OBJETIVO")
 TIMEOUT_TOTAL = 900        # 15 minutos máximo para todo el proceso de reintentos
 MAX_ESPERA_TURNOS = 300    # Máximo 5 minutos esperando que se actualicen los turnos
-INTERVALO_RECARGA = 5      # Segundos entre recargas de página
+INTERVALO_RECARGA = 2      # Segundos entre polls una vez pasada la rafaga inicial
+MAX_EMAILS_CONCURRENTES = 8  # Resend limita a 10 req/s
 MAX_REINTENTOS_NAVEGACION = 5
+PRE_BUFFER_CALENTAMIENTO = 10  # Segundos antes de la hora objetivo para precalentar el navegador
 TIMEOUT_NAVEGACION = 30000  # 30 segundos
 
+# Selectores CSS directos: los locators por rol/placeholder escanean todo el
+# DOM y resuelven mas lento, y el click de "Generar Turno" esta en el camino
+# critico de medianoche.
+SELECTOR_NOMBRE = "input[placeholder='Nombre*']"
+SELECTOR_APELLIDO = "input[placeholder='Apellido*']"
+SELECTOR_DOCUMENTO = "input[placeholder='DOCUMENTO*']"
+SELECTOR_FECHA = "input[type='date']"
+SELECTOR_GENERAR_BTN = "button[type='submit']"
+
+# JS que llena todos los campos en una sola ejecucion: un round-trip CDP en
+# vez de cinco. Usa el setter nativo de value (compatible con React/Vue) y
+# dispara input/change para que el framework de la SPA registre los cambios.
+_FILL_JS = f"""
+(d) => {{
+    const disparar = (el) => {{
+        el.dispatchEvent(new Event('input', {{ bubbles: true }}));
+        el.dispatchEvent(new Event('change', {{ bubbles: true }}));
+    }};
+    const setear = (sel, valor) => {{
+        const el = document.querySelector(sel);
+        if (!el) throw new Error('No se encontro ' + sel);
+        const setter = Object.getOwnPropertyDescriptor(
+            Object.getPrototypeOf(el), 'value').set;
+        setter.call(el, valor);
+        disparar(el);
+    }};
+    setear("{SELECTOR_NOMBRE}", d.nombre);
+    setear("{SELECTOR_APELLIDO}", d.apellido);
+    setear("{SELECTOR_FECHA}", d.fecha_iso);
+    setear("{SELECTOR_DOCUMENTO}", d.documento);
+    const sels = document.querySelectorAll('select');
+    if (sels.length < 2) throw new Error('No se encontro el select de menores');
+    sels[1].value = d.menores;
+    disparar(sels[1]);
+}}
+"""
+
+# Chromium sin subsistemas que el formulario no necesita: menos arranque,
+# menos red, menos render.
+BROWSER_ARGS = [
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--blink-settings=imagesEnabled=false",
+    "--disable-sync",
+    "--disable-translate",
+    "--disable-component-update",
+    "--disable-domain-reliability",
+    "--metrics-recording-only",
+    "--mute-audio",
+    "--no-first-run",
+    "--disable-features=Translate,BackForwardCache",
+]
+# Stylesheets quedan permitidos: los checks de accionabilidad del click
+# dependen del layout.
+RECURSOS_BLOQUEADOS = {"image", "font", "media"}
+# Beacons de analytics/trackers: bytes que el bot no necesita ver, y que
+# ademas demoran cada una de las recargas del poll de disponibilidad.
+DOMINIOS_BLOQUEADOS = (
+    "google-analytics",
+    "googletagmanager",
+    "facebook",
+    "hotjar",
+    "doubleclick",
+)
+
+# Perfil persistente: conserva cache HTTP y cookies entre corridas, asi los
+# goto posteriores salen del disco en vez de re-descargar la SPA.
+USER_DATA_DIR = Path(__file__).parent / ".chromium-profile"
+
+# Dias hasta el proximo miercoles, indexado por weekday() (un miercoles salta
+# al siguiente): reemplaza el modulo + branch por un lookup.
+_DIAS_HASTA_MIERCOLES = (2, 1, 7, 6, 5, 4, 3)
+
+
 def calcular_proximo_miercoles():
     ahora = datetime.now(TIMEZONE)
-    dias_hasta_miercoles = (2 - ahora.weekday()) % 7
-    if dias_hasta_miercoles == 0:
-        dias_hasta_miercoles = 7
-    proximo_miercoles = ahora + timedelta(days=dias_hasta_miercoles)
+    proximo_miercoles = ahora + timedelta(days=_DIAS_HASTA_MIERCOLES[ahora.weekday()])
     return proximo_miercoles
 
-def obtener_hora_objetivo():
-    ahora = datetime.now(TIMEZONE)
-    hora_objetivo_env = os.getenv("HORA_OBJETIVO")
+def obtener_hora_objetivo(ahora=None):
+    if ahora is None:
+        ahora = datetime.now(TIMEZONE)
+    hora_objetivo_env = _HORA_OBJETIVO_RAW
 
     if hora_objetivo_env:
         try:
@@ -67,103 +180,202 @@ def obtener_hora_objetivo():
     else:
         return datetime(ahora.year, ahora.month, ahora.day, 0, 0, 1, tzinfo=TIMEZONE)
 
-def esperar_hasta_hora_objetivo():
+def esperar_hasta_hora_objetivo(pre_buffer=0):
+    """Espera gruesa hasta `pre_buffer` segundos antes de la hora objetivo.
+
+    Devuelve la hora objetivo para que el llamador haga la espera fina con
+    esperar_instante_final() una vez que el navegador ya esta precalentado.
+    """
     import time
 
-    objetivo = obtener_hora_objetivo()
+    # Una sola lectura del reloj de pared: el resto de la espera se maneja
+    # contra perf_counter, sin volver a construir datetimes con tz.
     ahora = datetime.now(TIMEZONE)
+    anclaje = time.perf_counter()
+    objetivo = obtener_hora_objetivo(ahora)
 
     segundos_restantes = (objetivo - ahora).total_seconds()
 
     if segundos_restantes <= 0:
         print("Ya pasó la hora objetivo, ejecutando inmediatamente...")
-        return
+        return objetivo
 
     if segundos_restantes > 300:
         raise Exception(f"Demasiado tiempo de espera ({segundos_restantes:.0f} seg). El trigger debe dispararse ~30 seg antes de la hora objetivo.")
 
     print(f"Hora actual (Argentina): {ahora.strftime('%Y-%m-%d %H:%M:%S.%f')}")
     print(f"Hora objetivo: {objetivo.strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"Esperando {segundos_restantes:.1f} segundos...")
+    print(f"Esperando {segundos_restantes:.1f} segundos (pre_buffer={pre_buffer}s)...")
 
-    while True:
-        ahora = datetime.now(TIMEZONE)
-        segundos_restantes = (objetivo - ahora).total_seconds()
+    # Un solo sleep calculado en vez de una escalera de polls: cero CPU
+    # durante la espera y sin despertar cientos de veces al pedo.
+    restante = segundos_restantes - pre_buffer - (time.perf_counter() - anclaje)
+    if restante > 0.05:
+        time.sleep(restante - 0.02)
 
-        if segundos_restantes <= 2:
-            break
-        elif segundos_restantes > 10:
-            print(f"  Faltan {segundos_restantes:.0f} segundos...")
-            time.sleep(5)
-        else:
-            time.sleep(0.5)
+    return objetivo
 
-    while True:
-        ahora = datetime.now(TIMEZONE)
-        if ahora >= objetivo:
-            print(f"¡HORA EXACTA! {ahora.strftime('%H:%M:%S.%f')}")
-            break
-        time.sleep(0.01)
 
-def enviar_email(pdf_path: str, fecha_visita: str, datos: dict):
+async def esperar_instante_final(objetivo):
+    import time
+
+    restante = (objetivo - datetime.now(TIMEZONE)).total_seconds()
+    if restante > 0:
+        # Deadline absoluto en perf_counter (se calcula una sola vez, sin
+        # datetime.now(tz) por iteracion): sleep grueso, luego sleeps de 1ms
+        # hasta los ultimos 5ms, y un spin cooperativo el tramo final. El
+        # sleep(0) cede el event loop para que cualquier IPC pendiente de
+        # Playwright se drene antes del click de T-0.
+        deadline = time.perf_counter() + restante
+        while True:
+            faltante = deadline - time.perf_counter()
+            if faltante <= 0:
+                break
+            if faltante > 0.05:
+                await asyncio.sleep(faltante - 0.02)
+            elif faltante > 0.005:
+                await asyncio.sleep(0.001)
+            else:
+                await asyncio.sleep(0)
+
+    print(f"¡HORA EXACTA! {datetime.now(TIMEZONE).strftime('%H:%M:%S.%f')}")
+
+EMAIL_REMITENTE = "Turno Penitenciario <turno@ramiroschenone-dev.com>"
+
+# Plantillas del email compiladas una vez a nivel modulo; por envio solo se
+# interpolan los datos de la persona y la fecha.
+_EMAIL_SUBJECT_TPL = "Turno Penitenciario - {nombre} {apellido} - {fecha}"
+_EMAIL_FILENAME_TPL = "turno_{documento}_{fecha_guiones}.pdf"
+_EMAIL_HTML_TPL = """
+    <h2>Turno Generado Exitosamente</h2>
+    <p>Se ha generado el turno para la visita del <strong>{fecha}</strong>.</p>
+    <p><strong>Datos:</strong></p>
+    <ul>
+        <li>Nombre: {nombre} {apellido}</li>
+        <li>DNI: {documento}</li>
+        <li>Unidad: {unidad}</li>
+        <li>Fecha de visita: {fecha}</li>
+    </ul>
+    <p>El comprobante PDF se adjunta a este correo.</p>
+    """
+
+
+def _leer_pdf_base64(pdf_path: str) -> str:
+    # Codifica en chunks alineados a 3 bytes (57KB es multiplo de 3, asi no
+    # aparece padding intermedio): nunca conviven en memoria el PDF crudo
+    # completo y su base64 a la vez.
+    partes = bytearray()
+    with open(pdf_path, "rb") as f:
+        while chunk := f.read(57 * 1024):
+            partes += base64.b64encode(chunk)
+    return partes.decode("ascii")
+
+
+async def enviar_email(pdf_path: str, fecha_visita: str, datos: dict):
     if not RESEND_API_KEY or not EMAIL_DESTINATARIO:
         print("RESEND_API_KEY o EMAIL_DESTINATARIO no configurados, saltando envio de email")
         return False
 
-    resend.api_key = RESEND_API_KEY
-
-    with open(pdf_path, "rb") as f:
-        pdf_content = f.read()
-
-    pdf_base64 = base64.b64encode(pdf_content).decode("utf-8")
+    # Lectura + base64 en un thread: no bloquea el event loop mientras el
+    # navegador se esta cerrando en paralelo.
+    pdf_base64 = await asyncio.to_thread(_leer_pdf_base64, pdf_path)
 
     destinatarios = [email.strip() for email in EMAIL_DESTINATARIO.split(",")]
     print(f"Destinatarios: {destinatarios}")
 
-    exitos = 0
-    for destinatario in destinatarios:
-        print(f"Enviando email a: {destinatario}...")
+    # Todo lo que no depende del destinatario (subject, html, adjunto con el
+    # base64 gigante) se construye una sola vez y se comparte entre envios.
+    subject = _EMAIL_SUBJECT_TPL.format(
+        nombre=datos["nombre"], apellido=datos["apellido"], fecha=fecha_visita
+    )
+    html = _EMAIL_HTML_TPL.format(
+        nombre=datos["nombre"], apellido=datos["apellido"],
+        documento=datos["documento"], unidad=datos["unidad"], fecha=fecha_visita,
+    )
+    attachments = [
+        {
+            "filename": _EMAIL_FILENAME_TPL.format(
+                documento=datos["documento"], fecha_guiones=fecha_visita.replace('/', '-')
+            ),
+            "content": pdf_base64
+        }
+    ]
 
-        params = {
-            "from": "Turno Penitenciario <turno@ramiroschenone-dev.com>",
+    cliente = _obtener_cliente_resend()
+
+    lote = [
+        {
+            "from": EMAIL_REMITENTE,
             "to": [destinatario],
-            "subject": f"Turno Penitenciario - {datos['nombre']} {datos['apellido']} - {fecha_visita}",
-            "html": f"""
-            <h2>Turno Generado Exitosamente</h2>
-            <p>Se ha generado el turno para la visita del <strong>{fecha_visita}</strong>.</p>
-            <p><strong>Datos:</strong></p>
-            <ul>
-                <li>Nombre: {datos['nombre']} {datos['apellido']}</li>
-                <li>DNI: {datos['documento']}</li>
-                <li>Unidad: {datos['unidad']}</li>
-                <li>Fecha de visita: {fecha_visita}</li>
-            </ul>
-            <p>El comprobante PDF se adjunta a este correo.</p>
-            """,
-            "attachments": [
-                {
-                    "filename": f"turno_{datos['documento']}_{fecha_visita.replace('/', '-')}.pdf",
-                    "content": pdf_base64
-                }
-            ]
+            "subject": subject,
+            "html": html,
+            "attachments": attachments,
         }
+        for destinatario in destinatarios
+    ]
 
+    # Primero el endpoint batch: un solo round-trip HTTPS para todos los
+    # destinatarios. Si Resend lo rechaza, caemos al envio concurrente.
+    if len(lote) > 1:
         try:
-            response = resend.Emails.send(params)
-            print(f"  -> Enviado a {destinatario}: {response}")
-            exitos += 1
+            respuesta = await cliente.post("/emails/batch", json=lote)
+            respuesta.raise_for_status()
+            print(f"Emails enviados (batch): {len(destinatarios)}/{len(destinatarios)}")
+            return True
         except Exception as e:
-            print(f"  -> Error enviando a {destinatario}: {e}")
+            print(f"  Envio batch fallido ({e}), enviando por destinatario...")
+
+    # Los envios son independientes: se disparan en paralelo, acotados por
+    # el semaforo para no pisar el rate limit de Resend.
+    sem = asyncio.Semaphore(MAX_EMAILS_CONCURRENTES)
+
+    async def _enviar(params):
+        async with sem:
+            print(f"Enviando email a: {params['to'][0]}...")
+            respuesta = await cliente.post("/emails", json=params)
+            respuesta.raise_for_status()
+            return respuesta.json()
+
+    resultados = await asyncio.gather(
+        *(_enviar(p) for p in lote), return_exceptions=True
+    )
+
+    exitos = 0
+    for destinatario, resultado in zip(destinatarios, resultados):
+        if isinstance(resultado, Exception):
+            print(f"  -> Error enviando a {destinatario}: {resultado}")
+        else:
+            print(f"  -> Enviado a {destinatario}: {resultado}")
+            exitos += 1
 
     print(f"Emails enviados: {exitos}/{len(destinatarios)}")
     return exitos > 0
 
+async def _bloquear_recursos(route):
+    solicitud = route.request
+    if solicitud.resource_type in RECURSOS_BLOQUEADOS or any(
+        dominio in solicitud.url for dominio in DOMINIOS_BLOQUEADOS
+    ):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
 async def navegar_con_reintentos(page, url=URL, max_reintentos=MAX_REINTENTOS_NAVEGACION):
     for intento in range(1, max_reintentos + 1):
         try:
             print(f"  Navegando a {url} (intento {intento}/{max_reintentos})...")
             await page.goto(url, wait_until="domcontentloaded", timeout=TIMEOUT_NAVEGACION)
-            await page.wait_for_selector("select", timeout=15000)
+            # Predicado de "listo de verdad" en una sola espera: documento
+            # completo, los dos selects hidratados por el JS y el date input
+            # en el DOM. Se pollea dentro de Chromium, asi retomamos apenas
+            # se cumple en vez de adivinar con sleeps.
+            await page.wait_for_function(
+                "() => document.readyState === 'complete'"
+                " && document.querySelectorAll('select').length >= 2"
+                " && document.querySelector(\"input[type='date']\") !== null",
+                timeout=15000, polling=100,
+            )
             print(f"  Pagina cargada exitosamente")
             return True
         except Exception as e:
@@ -178,47 +390,172 @@ async def navegar_con_reintentos(page, url=URL, max_reintentos=MAX_REINTENTOS_NA
 
 async def cargar_pagina_y_seleccionar_unidad(page, datos):
     await navegar_con_reintentos(page)
-    await page.wait_for_timeout(1000)
     print("  Seleccionando unidad...")
     unidad_select = page.locator("select").first
     await unidad_select.select_option(value=datos["unidad"])
-    await page.wait_for_timeout(500)
+    # En vez de dormir 500ms a ciegas, espera la señal real de que el JS
+    # termino: elegir unidad repuebla el atributo max del date input, que es
+    # justo lo que lee esperar_turnos_disponibles.
+    try:
+        await page.wait_for_function(
+            "() => { const d = document.querySelector(\"input[type='date']\"); "
+            "return d && d.hasAttribute('max'); }",
+            timeout=5000,
+        )
+    except Exception:
+        # Sin max no hay restriccion de fecha: el poll lo trata como valido,
+        # asi que seguimos igual.
+        pass
 
 
 async def preparar_formulario(page, fecha_visita, datos):
     print("Llenando formulario...")
 
-    print(f"  Nombre: {datos['nombre']}")
-    nombre_input = page.get_by_placeholder("Nombre*")
-    await nombre_input.fill(datos["nombre"])
-
-    print(f"  Apellido: {datos['apellido']}")
-    apellido_input = page.get_by_placeholder("Apellido*")
-    await apellido_input.fill(datos["apellido"])
+    # Una sola pasada por el dict: el resto de la funcion trabaja con locals.
+    nombre = datos["nombre"]
+    apellido = datos["apellido"]
+    documento = datos["documento"]
+    menores = datos["menores"]
 
     fecha_str = fecha_visita.strftime('%d/%m/%Y')
-    print(f"  Fecha: {fecha_str}")
-    date_input = page.locator("input[type='date']")
     fecha_formato_input = fecha_visita.strftime("%Y-%m-%d")
-    await date_input.fill(fecha_formato_input)
 
-    print(f"  Documento: {datos['documento']}")
-    documento_input = page.get_by_placeholder("DOCUMENTO*")
-    await documento_input.fill(datos["documento"])
+    print(f"  Nombre: {nombre}")
+    print(f"  Apellido: {apellido}")
+    print(f"  Fecha: {fecha_str}")
+    print(f"  Documento: {documento}")
+    print(f"  Menores: {menores}")
+
+    payload = {
+        "nombre": nombre,
+        "apellido": apellido,
+        "documento": documento,
+        "menores": menores,
+        "fecha_iso": fecha_formato_input,
+    }
 
-    print(f"  Menores: {datos['menores']}")
-    menores_select = page.locator("select").nth(1)
-    await menores_select.select_option(value=datos["menores"])
+    try:
+        # Todo el formulario en un solo evaluate: un round-trip al navegador
+        # hace lo que antes hacian cinco.
+        await page.evaluate(_FILL_JS, payload)
+    except Exception as e:
+        print(f"  Fallo el llenado via evaluate ({e}), llenando campo por campo...")
+        await _llenar_campos_individualmente(page, payload)
 
     print("Formulario preparado, listo para enviar...")
     return fecha_str
 
+
+async def _llenar_campos_individualmente(page, payload):
+    """Camino de respaldo con locators por si el evaluate no aplica al DOM."""
+    await asyncio.gather(
+        page.locator(SELECTOR_NOMBRE).fill(payload["nombre"]),
+        page.locator(SELECTOR_APELLIDO).fill(payload["apellido"]),
+        page.locator(SELECTOR_FECHA).fill(payload["fecha_iso"]),
+        page.locator(SELECTOR_DOCUMENTO).fill(payload["documento"]),
+        page.locator("select").nth(1).select_option(value=payload["menores"]),
+    )
+
+async def _esperar_turnos_via_api(fecha_objetivo, datos):
+    """Pollea el max de fecha contra la API con httpx, sin tocar el navegador.
+
+    Devuelve True/False como esperar_turnos_disponibles, o None si la API no
+    respondio como se esperaba y hay que caer a las recargas de pagina.
+    """
+    import time
+    inicio = time.monotonic()
+    intento = 0
+
+    async with httpx.AsyncClient(timeout=5) as cliente:
+        while True:
+            intento += 1
+            try:
+                respuesta = await cliente.get(API_FECHAS_URL, params={"unidad": datos["unidad"]})
+                respuesta.raise_for_status()
+                cuerpo = respuesta.json()
+            except Exception as e:
+                print(f"  Error consultando la API de fechas: {e}")
+                return None
+
+            max_attr = cuerpo.get("max") if isinstance(cuerpo, dict) else None
+            print(f"  [API] max fecha={max_attr}, objetivo={fecha_objetivo} (intento #{intento})")
+
+            if max_attr is None or max_attr >= fecha_objetivo:
+                return True
+
+            transcurrido = time.monotonic() - inicio
+            if transcurrido >= MAX_ESPERA_TURNOS:
+                print(f"Timeout: turnos no disponibles via API despues de {MAX_ESPERA_TURNOS}s")
+                return False
+
+            await asyncio.sleep(_intervalo_poll(intento))
+
+
+def _intervalo_poll(intento):
+    """Espera antes del proximo poll de disponibilidad.
+
+    Los primeros intentos son rapidos y con jitter: si los turnos caen justo
+    en T-0 los agarramos enseguida, y el jitter evita sincronizarse con
+    otros bots que despiertan a la misma hora. Despues, ritmo fijo.
+    """
+    if intento <= 4:
+        return random.uniform(0, min(0.25 * (2 ** intento), 5.0))
+    return float(INTERVALO_RECARGA)
+
+
+async def obtener_handles(page):
+    """Resuelve una vez los element handles del camino caliente del click.
+
+    Un handle cacheado se clickea sin re-resolver el selector via CDP en
+    cada reintento. Devuelve None si no se pudo (se cae al locator).
+    """
+    try:
+        boton = await page.locator(SELECTOR_GENERAR_BTN).element_handle(timeout=5000)
+        handles = {"btn": boton}
+        # Sesion CDP y centro del boton precalculados durante el warm-up:
+        # el primer click puede salir como mensajes Input.dispatchMouseEvent
+        # crudos, sin los chequeos de actionability de Playwright.
+        try:
+            caja = await boton.bounding_box()
+            if caja:
+                handles["cdp"] = await page.context.new_cdp_session(page)
+                handles["x"] = caja["x"] + caja["width"] / 2
+                handles["y"] = caja["y"] + caja["height"] / 2
+        except Exception:
+            pass
+        return handles
+    except Exception as e:
+        print(f"  No se pudieron cachear handles ({e}); se resolvera por selector")
+        return None
+
+
+async def _click_cdp(handles):
+    """Click crudo sobre el centro del boton via CDP (mousePressed/Released)."""
+    for tipo in ("mousePressed", "mouseReleased"):
+        await handles["cdp"].send("Input.dispatchMouseEvent", {
+            "type": tipo,
+            "x": handles["x"],
+            "y": handles["y"],
+            "button": "left",
+            "clickCount": 1,
+        })
+
+
 async def esperar_turnos_disponibles(page, fecha_visita, datos):
     import time
     inicio = time.time()
     intento = 0
     fecha_objetivo = fecha_visita.strftime("%Y-%m-%d")
 
+    if API_FECHAS_URL:
+        disponible = await _esperar_turnos_via_api(fecha_objetivo, datos)
+        if disponible is not None:
+            if disponible:
+                print(f"Turnos disponibles via API! Cargando pagina para el formulario...")
+                await cargar_pagina_y_seleccionar_unidad(page, datos)
+            return disponible
+        print("  API de fechas no utilizable, usando recargas de pagina...")
+
     while True:
         intento += 1
         print(f"Verificando disponibilidad de turnos (intento #{intento})...")
@@ -241,85 +578,188 @@ async def esperar_turnos_disponibles(page, fecha_visita, datos):
             return False
 
         restante = MAX_ESPERA_TURNOS - transcurrido
-        print(f"  Turnos no disponibles aun. Reintentando en {INTERVALO_RECARGA}s (quedan {restante:.0f}s)...")
-        await asyncio.sleep(INTERVALO_RECARGA)
+        espera = _intervalo_poll(intento)
+        print(f"  Turnos no disponibles aun. Reintentando en {espera:.1f}s (quedan {restante:.0f}s)...")
+        await asyncio.sleep(espera)
 
 
-async def enviar_formulario_con_reintentos(page, downloads_path, fecha_visita, datos):
+async def enviar_formulario_con_reintentos(page, downloads_path, fecha_visita, datos, handles=None):
     import time
-    inicio = time.time()
+    inicio = time.monotonic()
     intento = 0
+    # Timestamp calculado una sola vez: datetime.now(tz) + strftime no tienen
+    # nada que hacer dentro del camino critico del click.
+    stamp = datetime.now(TIMEZONE).strftime('%Y%m%d_%H%M%S')
+    # Ring de capturas en memoria: se guardan las ultimas 3 y recien se
+    # vuelcan a disco si todo fallo. Mientras haya chances de conseguir el
+    # turno, el disco no se toca.
+    capturas = deque(maxlen=3)
+
+    def _volcar_capturas():
+        for n, jpeg in capturas:
+            ruta = downloads_path / f"error_intento{n}_{stamp}.jpg"
+            try:
+                ruta.write_bytes(jpeg)
+                print(f"Screenshot guardado: {ruta}")
+            except Exception:
+                print(f"No se pudo guardar screenshot del intento #{n}")
 
     while True:
         intento += 1
-        transcurrido = time.time() - inicio
+        transcurrido = time.monotonic() - inicio
 
         if transcurrido >= TIMEOUT_TOTAL:
             print(f"Timeout: {TIMEOUT_TOTAL}s agotados despues de {intento - 1} intentos")
+            _volcar_capturas()
             return None
 
         restante = TIMEOUT_TOTAL - transcurrido
 
         try:
-            generar_btn = page.get_by_role("button", name="Generar Turno")
+            generar_btn = handles["btn"] if handles else page.locator(SELECTOR_GENERAR_BTN)
             print(f"Intento #{intento} - Haciendo clic en GENERAR TURNO... (quedan {restante:.0f}s)")
             hora_click = datetime.now(TIMEZONE)
             print(f"Hora del click: {hora_click.strftime('%H:%M:%S.%f')}")
 
             async with page.expect_download(timeout=15000) as download_info:
-                await generar_btn.click()
+                # Solo el primer intento usa el click CDP crudo: si algo salio
+                # mal, los reintentos vuelven al click normal de Playwright,
+                # que verifica actionability y reposiciona si hizo falta.
+                if intento == 1 and handles and handles.get("cdp"):
+                    try:
+                        await _click_cdp(handles)
+                    except Exception:
+                        await generar_btn.click()
+                else:
+                    await generar_btn.click()
 
             download = await download_info.value
-            pdf_path = downloads_path / f"turno_{datos['documento']}_{datetime.now(TIMEZONE).strftime('%Y%m%d_%H%M%S')}.pdf"
+            pdf_path = downloads_path / f"turno_{datos['documento']}_{stamp}.pdf"
             await download.save_as(pdf_path)
             print(f"PDF guardado en: {pdf_path}")
             return pdf_path
 
         except Exception as e:
             print(f"Intento #{intento} fallido: {e}")
-            screenshot_path = downloads_path / f"error_intento{intento}_{datetime.now(TIMEZONE).strftime('%Y%m%d_%H%M%S')}.png"
-            try:
-                await page.screenshot(path=str(screenshot_path))
-                print(f"Screenshot guardado: {screenshot_path}")
-            except Exception:
-                print("No se pudo guardar screenshot")
-
-            if time.time() - inicio < TIMEOUT_TOTAL:
-                espera = min(2 ** min(intento, 4), 15)
-                print(f"Recargando pagina en {espera}s y re-llenando formulario...")
-                await asyncio.sleep(espera)
-                await cargar_pagina_y_seleccionar_unidad(page, datos)
-                await preparar_formulario(page, fecha_visita, datos)
+            # JPEG q50: mucho mas chico y rapido de codificar que el PNG que
+            # saca Chromium por defecto, y alcanza para diagnosticar.
+            screenshot_task = asyncio.create_task(page.screenshot(type="jpeg", quality=50))
+
+            if time.monotonic() - inicio < TIMEOUT_TOTAL:
+                # Backoff corto: arranca en 100ms y se clava en 500ms. En la
+                # carrera de medianoche, esperar segundos entre reintentos es
+                # regalar los turnos que quedan.
+                espera = min(0.1 * (2 ** (intento - 1)), 0.5)
+                print(f"Reintentando en {espera:.1f}s...")
+                # La captura se superpone con el backoff, pero tiene que
+                # terminar antes de una eventual re-navegacion (la invalida).
+                jpeg, _ = await asyncio.gather(
+                    screenshot_task, asyncio.sleep(espera), return_exceptions=True
+                )
+                if isinstance(jpeg, Exception):
+                    print("No se pudo capturar screenshot")
+                else:
+                    capturas.append((intento, jpeg))
+                # Si el formulario sigue en el DOM (tipico en un timeout de
+                # descarga), el estado cargado sigue valido: reintentar el
+                # click directo ahorra los segundos de recargar y re-llenar.
+                try:
+                    formulario_vivo = await page.locator(SELECTOR_DOCUMENTO).count() > 0
+                except Exception:
+                    formulario_vivo = False
+                if formulario_vivo:
+                    print("Formulario intacto, reintentando click sin recargar")
+                else:
+                    print("DOM invalidado, recargando pagina y re-llenando formulario...")
+                    await cargar_pagina_y_seleccionar_unidad(page, datos)
+                    await preparar_formulario(page, fecha_visita, datos)
+                    # La navegacion invalido los handles viejos.
+                    if handles is not None:
+                        handles = await obtener_handles(page)
             else:
+                try:
+                    capturas.append((intento, await screenshot_task))
+                except Exception:
+                    print("No se pudo capturar screenshot")
                 print(f"Tiempo agotado ({TIMEOUT_TOTAL}s). No se pudo completar.")
+                _volcar_capturas()
                 return None
 
 
-async def procesar_persona(downloads_path, fecha_visita, datos):
+async def enviar_formulario_via_api(downloads_path, fecha_visita, datos):
+    """Camino rapido: replica el POST del formulario con httpx, sin Chromium.
+
+    Devuelve la ruta del PDF si el servidor respondio con el comprobante,
+    o None para que el llamador caiga al camino con navegador.
+    """
+    campos = {
+        "nombre": datos["nombre"],
+        "apellido": datos["apellido"],
+        "documento": datos["documento"],
+        "unidad": datos["unidad"],
+        "menores": datos["menores"],
+        "fecha": fecha_visita.strftime("%Y-%m-%d"),
+    }
+
+    try:
+        async with httpx.AsyncClient(timeout=15) as client:
+            respuesta = await client.post(API_TURNOS_URL, data=campos)
+    except Exception as e:
+        print(f"  Error en el camino API: {e}. Usando navegador.")
+        return None
+
+    content_type = respuesta.headers.get("content-type", "")
+    if respuesta.status_code != 200 or "pdf" not in content_type:
+        print(f"  API no devolvio un PDF (status {respuesta.status_code}, "
+              f"content-type {content_type}). Usando navegador.")
+        return None
+
+    pdf_path = downloads_path / f"turno_{datos['documento']}_{datetime.now(TIMEZONE).strftime('%Y%m%d_%H%M%S')}.pdf"
+    pdf_path.write_bytes(respuesta.content)
+    print(f"PDF guardado en: {pdf_path} (via API, sin navegador)")
+    return pdf_path
+
+
+async def procesar_persona(page, downloads_path, fecha_visita, datos, objetivo=None):
     nombre_completo = f"{datos['nombre']} {datos['apellido']}"
     print(f"\n{'='*50}")
     print(f"Procesando: {nombre_completo} (DNI {datos['documento']})")
     print(f"{'='*50}\n")
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(accept_downloads=True)
-        page = await context.new_page()
+    fecha_str = fecha_visita.strftime('%d/%m/%Y')
 
-        turnos_listos = await esperar_turnos_disponibles(page, fecha_visita, datos)
-        if not turnos_listos:
-            print(f"No se pudieron actualizar los turnos para {nombre_completo}. Saltando.")
-            await browser.close()
-            return None
+    if API_TURNOS_URL:
+        if objetivo:
+            await esperar_instante_final(objetivo)
+        print("Intentando generar el turno via API (sin navegador)...")
+        pdf_path = await enviar_formulario_via_api(downloads_path, fecha_visita, datos)
+        if pdf_path and pdf_path.exists():
+            await enviar_email(str(pdf_path), fecha_str, datos)
+            return str(pdf_path)
+        print("Camino API fallido, cayendo al navegador...")
+
+    if objetivo and datetime.now(TIMEZONE) < objetivo:
+        # Precalienta la SPA durante el pre_buffer: la recarga de T-0
+        # sale con cache HTTP tibio y el click llega antes.
+        print("Precalentando pagina antes de la hora objetivo...")
+        try:
+            await cargar_pagina_y_seleccionar_unidad(page, datos)
+        except Exception as e:
+            print(f"  Precalentamiento fallido (no critico): {e}")
+        await esperar_instante_final(objetivo)
 
-        fecha_str = await preparar_formulario(page, fecha_visita, datos)
-        pdf_path = await enviar_formulario_con_reintentos(page, downloads_path, fecha_visita, datos)
+    turnos_listos = await esperar_turnos_disponibles(page, fecha_visita, datos)
+    if not turnos_listos:
+        print(f"No se pudieron actualizar los turnos para {nombre_completo}. Saltando.")
+        return None
 
-        await browser.close()
+    fecha_str = await preparar_formulario(page, fecha_visita, datos)
+    handles = await obtener_handles(page)
+    pdf_path = await enviar_formulario_con_reintentos(page, downloads_path, fecha_visita, datos, handles=handles)
 
     if pdf_path and pdf_path.exists():
         print(f"Enviando email para {nombre_completo}...")
-        enviar_email(str(pdf_path), fecha_str, datos)
+        await enviar_email(str(pdf_path), fecha_str, datos)
 
     return str(pdf_path) if pdf_path else None
 
@@ -332,6 +772,8 @@ async def run():
     print(f"Fecha de visita calculada: {fecha_visita.strftime('%d/%m/%Y')}")
     print(f"Personas a procesar: {len(PERSONAS)}")
 
+    objetivo = None
+
     if MODO_TEST:
         print("\n" + "="*50)
         print("MODO TEST - ENVIANDO INMEDIATAMENTE")
@@ -341,7 +783,7 @@ async def run():
         print("MODO PRODUCCION - ESPERANDO HORA OBJETIVO")
         print("="*50 + "\n")
 
-        esperar_hasta_hora_objetivo()
+        objetivo = esperar_hasta_hora_objetivo(pre_buffer=PRE_BUFFER_CALENTAMIENTO)
 
         print("\n" + "="*50)
         print("¡CARGANDO FORMULARIO Y ENVIANDO!")
@@ -349,10 +791,30 @@ async def run():
 
     resultados = []
 
-    for i, datos in enumerate(PERSONAS, start=1):
-        print(f"\nPersona {i}/{len(PERSONAS)}")
-        pdf_path = await procesar_persona(downloads_path, fecha_visita, datos)
-        resultados.append(pdf_path)
+    # Un solo Chromium para todas las personas: el arranque (~1-2s) se paga
+    # una vez y las siguientes cargas salen del cache del perfil.
+    async with async_playwright() as p:
+        context = await p.chromium.launch_persistent_context(
+            user_data_dir=str(USER_DATA_DIR),
+            headless=True,
+            args=BROWSER_ARGS,
+            accept_downloads=True,
+            # Viewport chico (menos layout), sin service workers y con CSP
+            # bypasseado para que el evaluate del llenado nunca se bloquee.
+            viewport={"width": 800, "height": 600},
+            service_workers="block",
+            bypass_csp=True,
+        )
+        await context.route("**/*", _bloquear_recursos)
+        page = await context.new_page()
+
+        try:
+            for i, datos in enumerate(PERSONAS, start=1):
+                print(f"\nPersona {i}/{len(PERSONAS)}")
+                pdf_path = await procesar_persona(page, downloads_path, fecha_visita, datos, objetivo=objetivo)
+                resultados.append(pdf_path)
+        finally:
+            await context.close()
 
     exitosos = [r for r in resultados if r]
     print(f"\nResumen: {len(exitosos)}/{len(PERSONAS)} turnos generados exitosamente")
@@ -370,6 +832,8 @@ async def main():
     except Exception as e:
         print(f"Error durante la ejecucion: {e}")
         raise
+    finally:
+        await cerrar_cliente_resend()
 
 if __name__ == "__main__":
     asyncio.run(main())
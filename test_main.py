@@ -1,169 +1,128 @@
 import asyncio
+from contextlib import asynccontextmanager
+from itertools import chain, repeat
+
 import pytest
-from unittest.mock import AsyncMock, MagicMock, patch, PropertyMock
+from unittest.mock import AsyncMock, MagicMock, call, patch, PropertyMock
 from datetime import datetime, timedelta
+from pathlib import Path
 from zoneinfo import ZoneInfo
 
+import main
+from main import (
+    PERSONAS,
+    SELECTOR_APELLIDO,
+    SELECTOR_DOCUMENTO,
+    SELECTOR_FECHA,
+    SELECTOR_NOMBRE,
+    calcular_proximo_miercoles,
+    cargar_pagina_y_seleccionar_unidad,
+    enviar_formulario_con_reintentos,
+    esperar_turnos_disponibles,
+    navegar_con_reintentos,
+    preparar_formulario,
+    procesar_persona,
+    run,
+)
+
+from conftest import done_future, failing_then_ok
+
 TIMEZONE = ZoneInfo("America/Argentina/Buenos_Aires")
 
+# Miércoles de referencia usado en todo el suite
+FECHA_TEST = datetime(2026, 2, 25, tzinfo=TIMEZONE)
 
-# ─── Tests para calcular_proximo_miercoles ───────────────────────────────────
 
-class TestCalcularProximoMiercoles:
-    @patch("main.datetime")
-    def test_desde_lunes_devuelve_miercoles_mismo_semana(self, mock_dt):
-        # Lunes 2026-02-16
-        fake_now = datetime(2026, 2, 16, 10, 0, 0, tzinfo=TIMEZONE)
-        mock_dt.now.return_value = fake_now
-        mock_dt.side_effect = lambda *a, **kw: datetime(*a, **kw)
+@asynccontextmanager
+async def _fail_download_cm():
+    """Context manager async que revienta al entrar: simula expect_download fallido."""
+    raise Exception("Download failed")
+    yield  # inalcanzable, pero necesario para que sea un generador
 
-        from main import calcular_proximo_miercoles
-        result = calcular_proximo_miercoles()
-        assert result.weekday() == 2  # Miércoles
-        assert result.day == 18
 
-    @patch("main.datetime")
-    def test_desde_miercoles_devuelve_proximo_miercoles(self, mock_dt):
-        # Miércoles 2026-02-18
-        fake_now = datetime(2026, 2, 18, 10, 0, 0, tzinfo=TIMEZONE)
-        mock_dt.now.return_value = fake_now
-        mock_dt.side_effect = lambda *a, **kw: datetime(*a, **kw)
-
-        from main import calcular_proximo_miercoles
-        result = calcular_proximo_miercoles()
-        assert result.weekday() == 2
-        assert result.day == 25  # Siguiente miércoles, no el actual
+# ─── Tests para calcular_proximo_miercoles ───────────────────────────────────
 
+class TestCalcularProximoMiercoles:
+    @pytest.mark.parametrize(
+        "fake_now, dia_esperado",
+        [
+            # Lunes: cae en el miércoles de la misma semana
+            (datetime(2026, 2, 16, 10, 0, 0, tzinfo=TIMEZONE), 18),
+            # Miércoles: salta al siguiente, no al actual
+            (datetime(2026, 2, 18, 10, 0, 0, tzinfo=TIMEZONE), 25),
+            # Jueves a la noche: miércoles de la semana que viene
+            (datetime(2026, 2, 19, 23, 58, 0, tzinfo=TIMEZONE), 25),
+        ],
+        ids=["desde_lunes", "desde_miercoles", "desde_jueves"],
+    )
     @patch("main.datetime")
-    def test_desde_jueves_devuelve_miercoles_siguiente(self, mock_dt):
-        # Jueves 2026-02-19
-        fake_now = datetime(2026, 2, 19, 23, 58, 0, tzinfo=TIMEZONE)
+    def test_proximo_miercoles(self, mock_dt, fake_now, dia_esperado):
         mock_dt.now.return_value = fake_now
         mock_dt.side_effect = lambda *a, **kw: datetime(*a, **kw)
-
-        from main import calcular_proximo_miercoles
         result = calcular_proximo_miercoles()
-        assert result.weekday() == 2
-        assert result.day == 25
+        assert result.weekday() == 2  # Miércoles
+        assert result.day == dia_esperado
 
 
 # ─── Tests para navegar_con_reintentos ───────────────────────────────────────
 
 class TestNavegarConReintentos:
-    @pytest.mark.asyncio
-    async def test_exito_primer_intento(self):
-        page = AsyncMock()
-        page.goto = AsyncMock()
-        page.wait_for_selector = AsyncMock()
-
-        from main import navegar_con_reintentos
-        result = await navegar_con_reintentos(page, "https://example.com", max_reintentos=3)
-
-        assert result is True
-        assert page.goto.call_count == 1
-        page.goto.assert_called_with(
-            "https://example.com",
-            wait_until="domcontentloaded",
-            timeout=30000
-        )
-
-    @pytest.mark.asyncio
-    async def test_exito_tercer_intento(self):
-        page = AsyncMock()
-        page.goto = AsyncMock(
-            side_effect=[
-                Exception("net::ERR_CONNECTION_RESET"),
-                Exception("net::ERR_CONNECTION_RESET"),
-                None,  # Éxito en el tercer intento
-            ]
-        )
-        page.wait_for_selector = AsyncMock()
-
-        from main import navegar_con_reintentos
-        with patch("main.asyncio.sleep", new_callable=AsyncMock):
-            result = await navegar_con_reintentos(page, "https://example.com", max_reintentos=3)
-
-        assert result is True
-        assert page.goto.call_count == 3
-
-    @pytest.mark.asyncio
-    async def test_falla_todos_los_intentos(self):
-        page = AsyncMock()
-        page.goto = AsyncMock(side_effect=Exception("net::ERR_CONNECTION_RESET"))
-        page.wait_for_selector = AsyncMock()
-
-        from main import navegar_con_reintentos
-        with patch("main.asyncio.sleep", new_callable=AsyncMock):
+    @pytest.mark.parametrize(
+        "goto_effects, wff_effects, goto_esperados, falla",
+        [
+            # Éxito inmediato
+            (None, None, 1, False),
+            # Dos resets de red, éxito en el tercer intento
+            (failing_then_ok(2, Exception("net::ERR_CONNECTION_RESET")), None, 3, False),
+            # Todos los intentos fallan: levanta la excepción final
+            (Exception("net::ERR_CONNECTION_RESET"), None, 3, True),
+            # goto anda pero el predicado de listo no se cumple: reintenta
+            (None, failing_then_ok(1, Exception("Timeout waiting for function")), 2, False),
+        ],
+        ids=["exito_primer_intento", "exito_tercer_intento",
+             "falla_todos_los_intentos", "falla_predicado_reintenta"],
+    )
+    async def test_reintentos(self, goto_effects, wff_effects, goto_esperados, falla, fake_page):
+        page = fake_page
+        page.goto = AsyncMock(side_effect=goto_effects)
+        page.wait_for_function = AsyncMock(side_effect=wff_effects)
+
+        if falla:
             with pytest.raises(Exception, match="No se pudo cargar la pagina"):
                 await navegar_con_reintentos(page, "https://example.com", max_reintentos=3)
-
-        assert page.goto.call_count == 3
-
-    @pytest.mark.asyncio
-    async def test_falla_selector_reintenta(self):
-        """Si goto funciona pero el selector no aparece, debe reintentar."""
-        page = AsyncMock()
-        page.goto = AsyncMock()
-        page.wait_for_selector = AsyncMock(
-            side_effect=[
-                Exception("Timeout waiting for selector"),
-                None,  # Éxito
-            ]
-        )
-
-        from main import navegar_con_reintentos
-        with patch("main.asyncio.sleep", new_callable=AsyncMock):
+        else:
             result = await navegar_con_reintentos(page, "https://example.com", max_reintentos=3)
+            assert result is True
 
-        assert result is True
-        assert page.goto.call_count == 2
-
-    @pytest.mark.asyncio
-    async def test_backoff_exponencial(self):
-        page = AsyncMock()
-        page.goto = AsyncMock(
-            side_effect=[
-                Exception("fail 1"),
-                Exception("fail 2"),
-                Exception("fail 3"),
-                None,
-            ]
-        )
-        page.wait_for_selector = AsyncMock()
-
-        sleep_calls = []
+        assert page.goto.call_count == goto_esperados
 
-        async def mock_sleep(seconds):
-            sleep_calls.append(seconds)
+    async def test_backoff_exponencial(self, no_sleep, fake_page):
+        page = fake_page
+        page.goto = AsyncMock(side_effect=failing_then_ok(3, Exception("net::ERR_CONNECTION_RESET")))
 
-        from main import navegar_con_reintentos
-        with patch("main.asyncio.sleep", side_effect=mock_sleep):
-            await navegar_con_reintentos(page, "https://example.com", max_reintentos=5)
+        await navegar_con_reintentos(page, "https://example.com", max_reintentos=5)
 
         # Backoff: min(2^1, 15)=2, min(2^2, 15)=4, min(2^3, 15)=8
-        assert sleep_calls == [2, 4, 8]
+        assert [c.args[0] for c in no_sleep.await_args_list] == [2, 4, 8]
 
 
 # ─── Tests para cargar_pagina_y_seleccionar_unidad ───────────────────────────
 
 class TestCargarPaginaYSeleccionarUnidad:
-    @pytest.mark.asyncio
-    async def test_carga_y_selecciona(self):
-        page = AsyncMock()
+    async def test_carga_y_selecciona(self, fake_page):
+        page = fake_page
         mock_select = AsyncMock()
         mock_locator_result = MagicMock()
         mock_locator_result.first = mock_select
         page.locator = MagicMock(return_value=mock_locator_result)
-        page.wait_for_timeout = AsyncMock()
 
         datos = {"unidad": "Unidad 11, PIÑERO"}
         with patch("main.navegar_con_reintentos", new_callable=AsyncMock) as mock_nav:
             mock_nav.return_value = True
-            from main import cargar_pagina_y_seleccionar_unidad
             await cargar_pagina_y_seleccionar_unidad(page, datos)
 
-        mock_nav.assert_called_once()
-        mock_select.select_option.assert_called_once_with(value="Unidad 11, PIÑERO")
+        assert mock_nav.await_count == 1
+        assert mock_select.select_option.await_args == call(value="Unidad 11, PIÑERO")
 
 
 # ─── Tests para preparar_formulario ──────────────────────────────────────────
@@ -178,10 +137,24 @@ DATOS_TEST = {
 
 
 class TestPrepararFormulario:
-    @pytest.mark.asyncio
-    async def test_llena_todos_los_campos(self):
-        page = AsyncMock()
-        fecha = datetime(2026, 2, 25, tzinfo=TIMEZONE)
+    async def test_llena_todos_los_campos(self, fake_page):
+        """El llenado se hace en un solo page.evaluate con todos los datos."""
+        page = fake_page
+        result = await preparar_formulario(page, FECHA_TEST, DATOS_TEST)
+
+        assert result == "25/02/2026"
+        page.evaluate.assert_awaited_once()
+        payload = page.evaluate.call_args.args[1]
+        assert payload["nombre"] == "Paola Fabiana"
+        assert payload["apellido"] == "Veron"
+        assert payload["documento"] == "24470091"
+        assert payload["fecha_iso"] == "2026-02-25"
+        assert payload["menores"] == "0"
+
+    async def test_fallback_llena_campo_por_campo(self, fake_page):
+        """Si el evaluate falla, cae al llenado individual con locators."""
+        page = fake_page
+        page.evaluate = AsyncMock(side_effect=Exception("CSP bloqueado"))
 
         mock_nombre = AsyncMock()
         mock_apellido = AsyncMock()
@@ -189,40 +162,30 @@ class TestPrepararFormulario:
         mock_date = AsyncMock()
         mock_menores = AsyncMock()
 
-        page.get_by_placeholder = MagicMock(side_effect=lambda p: {
-            "Nombre*": mock_nombre,
-            "Apellido*": mock_apellido,
-            "DOCUMENTO*": mock_doc,
-        }[p])
-
-        page.locator = MagicMock(side_effect=lambda sel: {
-            "input[type='date']": mock_date,
+        # Tabla armada una sola vez: el lambda solo resuelve el selector,
+        # no reconstruye el dict (ni un mock default nuevo) por llamada
+        _default_loc = MagicMock()
+        locators = {
+            SELECTOR_NOMBRE: mock_nombre,
+            SELECTOR_APELLIDO: mock_apellido,
+            SELECTOR_DOCUMENTO: mock_doc,
+            SELECTOR_FECHA: mock_date,
             "select": MagicMock(nth=MagicMock(return_value=mock_menores)),
-        }.get(sel, MagicMock()))
-
-        from main import preparar_formulario
-        result = await preparar_formulario(page, fecha, DATOS_TEST)
+        }
+        page.locator = MagicMock(side_effect=lambda sel: locators.get(sel, _default_loc))
+        result = await preparar_formulario(page, FECHA_TEST, DATOS_TEST)
 
         assert result == "25/02/2026"
-        mock_nombre.fill.assert_called_once_with("Paola Fabiana")
-        mock_apellido.fill.assert_called_once_with("Veron")
-        mock_doc.fill.assert_called_once_with("24470091")
-        mock_date.fill.assert_called_once_with("2026-02-25")
+        assert mock_nombre.fill.await_args.args == ("Paola Fabiana",)
+        assert mock_apellido.fill.await_args.args == ("Veron",)
+        assert mock_doc.fill.await_args.args == ("24470091",)
+        assert mock_date.fill.await_args.args == ("2026-02-25",)
+        assert mock_menores.select_option.await_args == call(value="0")
 
-    @pytest.mark.asyncio
-    async def test_no_navega(self):
+    async def test_no_navega(self, fake_page):
         """Verifica que preparar_formulario NO llama page.goto."""
-        page = AsyncMock()
-        fecha = datetime(2026, 2, 25, tzinfo=TIMEZONE)
-
-        mock_input = AsyncMock()
-        page.get_by_placeholder = MagicMock(return_value=mock_input)
-        mock_locator = AsyncMock()
-        mock_locator.nth = MagicMock(return_value=AsyncMock())
-        page.locator = MagicMock(return_value=mock_locator)
-
-        from main import preparar_formulario
-        await preparar_formulario(page, fecha, DATOS_TEST)
+        page = fake_page
+        await preparar_formulario(page, FECHA_TEST, DATOS_TEST)
 
         page.goto.assert_not_called()
 
@@ -230,25 +193,20 @@ class TestPrepararFormulario:
 # ─── Tests para esperar_turnos_disponibles ───────────────────────────────────
 
 class TestEsperarTurnosDisponibles:
-    @pytest.mark.asyncio
-    async def test_turnos_disponibles_primer_intento(self):
-        page = AsyncMock()
-        fecha = datetime(2026, 2, 25, tzinfo=TIMEZONE)
+    async def test_turnos_disponibles_primer_intento(self, fake_page):
+        page = fake_page
 
         mock_date_input = AsyncMock()
         mock_date_input.get_attribute = AsyncMock(return_value="2026-02-25")
         page.locator = MagicMock(return_value=mock_date_input)
 
         with patch("main.cargar_pagina_y_seleccionar_unidad", new_callable=AsyncMock):
-            from main import esperar_turnos_disponibles
-            result = await esperar_turnos_disponibles(page, fecha, DATOS_TEST)
+            result = await esperar_turnos_disponibles(page, FECHA_TEST, DATOS_TEST)
 
         assert result is True
 
-    @pytest.mark.asyncio
-    async def test_turnos_no_disponibles_luego_si(self):
-        page = AsyncMock()
-        fecha = datetime(2026, 2, 25, tzinfo=TIMEZONE)
+    async def test_turnos_no_disponibles_luego_si(self, fake_page):
+        page = fake_page
 
         mock_date_input = AsyncMock()
         mock_date_input.get_attribute = AsyncMock(
@@ -256,27 +214,22 @@ class TestEsperarTurnosDisponibles:
         )
         page.locator = MagicMock(return_value=mock_date_input)
 
-        with patch("main.cargar_pagina_y_seleccionar_unidad", new_callable=AsyncMock), \
-             patch("main.asyncio.sleep", new_callable=AsyncMock):
-            from main import esperar_turnos_disponibles
-            result = await esperar_turnos_disponibles(page, fecha, DATOS_TEST)
+        with patch("main.cargar_pagina_y_seleccionar_unidad", new_callable=AsyncMock):
+            result = await esperar_turnos_disponibles(page, FECHA_TEST, DATOS_TEST)
 
         assert result is True
         assert mock_date_input.get_attribute.call_count == 3
 
-    @pytest.mark.asyncio
-    async def test_max_none_es_valido(self):
+    async def test_max_none_es_valido(self, fake_page):
         """Si max es None, se considera válido (sin restricción)."""
-        page = AsyncMock()
-        fecha = datetime(2026, 2, 25, tzinfo=TIMEZONE)
+        page = fake_page
 
         mock_date_input = AsyncMock()
         mock_date_input.get_attribute = AsyncMock(return_value=None)
         page.locator = MagicMock(return_value=mock_date_input)
 
         with patch("main.cargar_pagina_y_seleccionar_unidad", new_callable=AsyncMock):
-            from main import esperar_turnos_disponibles
-            result = await esperar_turnos_disponibles(page, fecha, DATOS_TEST)
+            result = await esperar_turnos_disponibles(page, FECHA_TEST, DATOS_TEST)
 
         assert result is True
 
@@ -284,7 +237,7 @@ class TestEsperarTurnosDisponibles:
 # ─── Tests para el flujo completo (sin doble navegación) ─────────────────────
 
 class TestFlujoCompleto:
-    @pytest.mark.asyncio
+    @pytest.mark.integration
     async def test_no_hay_doble_navegacion(self):
         """
         Test CRITICO: verifica que entre esperar_turnos_disponibles y
@@ -300,36 +253,37 @@ class TestFlujoCompleto:
         page.wait_for_selector = AsyncMock()
         page.wait_for_timeout = AsyncMock()
 
-        mock_select = AsyncMock()
+        # select_option se await-ea pero nunca se inspecciona: alcanza con
+        # un future ya resuelto en vez de un AsyncMock completo.
+        mock_select = MagicMock(select_option=MagicMock(return_value=done_future()))
         mock_date_input = AsyncMock()
         mock_date_input.get_attribute = AsyncMock(return_value="2026-02-25")
-        mock_input = AsyncMock()
-        mock_menores = AsyncMock()
+        mock_menores = MagicMock(select_option=MagicMock(return_value=done_future()))
+
+        # Mocks construidos una sola vez: el side effect solo elige cual
+        # devolver, no fabrica uno nuevo por llamada
+        select_mock = MagicMock()
+        select_mock.first = mock_select
+        select_mock.nth = MagicMock(return_value=mock_menores)
+        _default_mock = AsyncMock()
 
         def locator_side_effect(sel):
             if sel == "select":
-                mock = MagicMock()
-                mock.first = mock_select
-                mock.nth = MagicMock(return_value=mock_menores)
-                return mock
+                return select_mock
             elif sel == "input[type='date']":
                 return mock_date_input
-            return AsyncMock()
+            return _default_mock
 
         page.locator = MagicMock(side_effect=locator_side_effect)
-        page.get_by_placeholder = MagicMock(return_value=mock_input)
-        page.get_by_role = MagicMock(return_value=AsyncMock())
 
-        fecha = datetime(2026, 2, 25, tzinfo=TIMEZONE)
 
-        from main import esperar_turnos_disponibles, preparar_formulario
 
         # Paso 1: esperar turnos
-        await esperar_turnos_disponibles(page, fecha, DATOS_TEST)
+        await esperar_turnos_disponibles(page, FECHA_TEST, DATOS_TEST)
         nav_count_after_esperar = len(goto_calls)
 
         # Paso 2: preparar formulario (NO debe navegar)
-        await preparar_formulario(page, fecha, DATOS_TEST)
+        await preparar_formulario(page, FECHA_TEST, DATOS_TEST)
         nav_count_after_preparar = len(goto_calls)
 
         # Solo una navegación total (la de esperar_turnos_disponibles)
@@ -342,49 +296,24 @@ class TestFlujoCompleto:
 # ─── Tests para enviar_formulario_con_reintentos ─────────────────────────────
 
 class TestEnviarFormularioConReintentos:
-    @pytest.mark.asyncio
-    async def test_reintento_basado_en_tiempo_no_en_conteo(self):
-        """Verifica que los reintentos son por tiempo (TIMEOUT_TOTAL), no por conteo fijo."""
-        from main import TIMEOUT_TOTAL
-        assert TIMEOUT_TOTAL == 900, "TIMEOUT_TOTAL debe ser 15 minutos (900 segundos)"
-
-    @pytest.mark.asyncio
-    async def test_timeout_detiene_reintentos(self):
+    async def test_timeout_detiene_reintentos(self, fake_page):
         """Verifica que se detiene cuando se agota el tiempo."""
-        page = AsyncMock()
+        page = fake_page
         downloads_path = MagicMock()
-        fecha = datetime(2026, 2, 25, tzinfo=TIMEZONE)
 
         mock_btn = AsyncMock()
-        page.get_by_role = MagicMock(return_value=mock_btn)
+        page.locator = MagicMock(return_value=mock_btn)
         page.screenshot = AsyncMock()
 
         # Simular que expect_download siempre falla
-        async def always_fail_download(timeout=None):
-            class FailCtx:
-                async def __aenter__(self_inner):
-                    raise Exception("Download failed")
-                async def __aexit__(self_inner, *a):
-                    pass
-            return FailCtx()
-
-        page.expect_download = always_fail_download
-
-        # Simular que ya pasaron 900+ segundos
-        call_count = 0
-        def mock_time():
-            nonlocal call_count
-            call_count += 1
-            if call_count <= 1:
-                return 0  # inicio
-            return 901  # ya paso el timeout
+        page.expect_download = lambda *a, **kw: _fail_download_cm()
 
+        # Reloj simulado: la primera lectura es el inicio (0) y todas las
+        # siguientes ya pasaron el timeout (901)
         with patch("main.cargar_pagina_y_seleccionar_unidad", new_callable=AsyncMock), \
              patch("main.preparar_formulario", new_callable=AsyncMock), \
-             patch("main.asyncio.sleep", new_callable=AsyncMock), \
-             patch("time.time", side_effect=mock_time):
-            from main import enviar_formulario_con_reintentos
-            result = await enviar_formulario_con_reintentos(page, downloads_path, fecha, DATOS_TEST)
+             patch("time.monotonic", side_effect=chain([0], repeat(901))):
+            result = await enviar_formulario_con_reintentos(page, downloads_path, FECHA_TEST, DATOS_TEST)
 
         assert result is None
 
@@ -392,31 +321,31 @@ class TestEnviarFormularioConReintentos:
 # ─── Test de integración: verificar que wait_until no es networkidle ─────────
 
 class TestConfiguracion:
-    @pytest.mark.asyncio
-    async def test_usa_domcontentloaded_no_networkidle(self):
-        """Verifica que la navegación usa domcontentloaded en vez de networkidle."""
-        page = AsyncMock()
-        page.goto = AsyncMock()
-        page.wait_for_selector = AsyncMock()
-
-        from main import navegar_con_reintentos
+    async def test_usa_domcontentloaded_no_networkidle(self, fake_page):
+        """El camino feliz hace un único goto, con domcontentloaded (no networkidle)."""
+        page = fake_page
         await navegar_con_reintentos(page, "https://example.com")
 
-        call_kwargs = page.goto.call_args[1]
-        assert call_kwargs["wait_until"] == "domcontentloaded", \
-            f"Debe usar domcontentloaded, no {call_kwargs['wait_until']}"
-
-    def test_max_reintentos_navegacion_es_5(self):
-        from main import MAX_REINTENTOS_NAVEGACION
-        assert MAX_REINTENTOS_NAVEGACION == 5
-
-    def test_timeout_navegacion_es_30s(self):
-        from main import TIMEOUT_NAVEGACION
-        assert TIMEOUT_NAVEGACION == 30000
+        assert page.goto.call_count == 1
+        kwargs = page.goto.call_args.kwargs
+        assert kwargs["wait_until"] == "domcontentloaded", \
+            f"Debe usar domcontentloaded, no {kwargs['wait_until']}"
+        assert kwargs["timeout"] == main.TIMEOUT_NAVEGACION
+
+    @pytest.mark.parametrize(
+        "nombre, esperado",
+        [
+            ("MAX_REINTENTOS_NAVEGACION", 5),
+            ("TIMEOUT_NAVEGACION", 30000),
+            # Los reintentos de envío son por tiempo (15 minutos), no por conteo
+            ("TIMEOUT_TOTAL", 900),
+        ],
+    )
+    def test_constantes(self, nombre, esperado):
+        assert getattr(main, nombre) == esperado
 
     def test_personas_es_lista(self):
         """Verifica que PERSONAS es una lista con al menos una persona."""
-        from main import PERSONAS
         assert isinstance(PERSONAS, list)
         assert len(PERSONAS) >= 1
         for p in PERSONAS:
@@ -426,13 +355,10 @@ class TestConfiguracion:
 # ─── Tests para procesar_persona ─────────────────────────────────────────────
 
 class TestProcesarPersona:
-    @pytest.mark.asyncio
-    async def test_flujo_exitoso(self):
+    async def test_flujo_exitoso(self, fake_page):
         """Verifica el flujo completo atómico para una persona."""
-        from pathlib import Path
-        page = AsyncMock()
+        page = fake_page
         downloads_path = MagicMock()
-        fecha = datetime(2026, 2, 25, tzinfo=TIMEZONE)
         fake_pdf = MagicMock(spec=Path)
         fake_pdf.exists.return_value = True
         fake_pdf.__str__ = lambda self: "/downloads/turno_test.pdf"
@@ -440,31 +366,26 @@ class TestProcesarPersona:
         with patch("main.esperar_turnos_disponibles", new_callable=AsyncMock, return_value=True), \
              patch("main.preparar_formulario", new_callable=AsyncMock, return_value="25/02/2026"), \
              patch("main.enviar_formulario_con_reintentos", new_callable=AsyncMock, return_value=fake_pdf), \
-             patch("main.enviar_email") as mock_email:
-            from main import procesar_persona
-            result = await procesar_persona(page, downloads_path, fecha, DATOS_TEST)
+             patch("main.enviar_email", new_callable=AsyncMock) as mock_email:
+            result = await procesar_persona(page, downloads_path, FECHA_TEST, DATOS_TEST)
 
         assert result == str(fake_pdf)
         mock_email.assert_called_once_with(str(fake_pdf), "25/02/2026", DATOS_TEST)
 
-    @pytest.mark.asyncio
-    async def test_turnos_no_disponibles_retorna_none(self):
+    async def test_turnos_no_disponibles_retorna_none(self, fake_page):
         """Si los turnos no están disponibles, retorna None sin continuar."""
-        page = AsyncMock()
+        page = fake_page
         downloads_path = MagicMock()
-        fecha = datetime(2026, 2, 25, tzinfo=TIMEZONE)
 
         with patch("main.esperar_turnos_disponibles", new_callable=AsyncMock, return_value=False), \
              patch("main.preparar_formulario", new_callable=AsyncMock) as mock_prep, \
              patch("main.enviar_formulario_con_reintentos", new_callable=AsyncMock) as mock_enviar:
-            from main import procesar_persona
-            result = await procesar_persona(page, downloads_path, fecha, DATOS_TEST)
+            result = await procesar_persona(page, downloads_path, FECHA_TEST, DATOS_TEST)
 
         assert result is None
         mock_prep.assert_not_called()
         mock_enviar.assert_not_called()
 
-    @pytest.mark.asyncio
     async def test_multiples_personas_llama_procesar_para_cada_una(self):
         """Verifica que run() llama procesar_persona una vez por cada persona en PERSONAS."""
         personas_test = [
@@ -474,7 +395,7 @@ class TestProcesarPersona:
 
         llamadas = []
 
-        async def mock_procesar(page, downloads_path, fecha_visita, datos):
+        async def mock_procesar(page, downloads_path, fecha_visita, datos, objetivo=None):
             llamadas.append(datos["documento"])
             return f"/fake/{datos['documento']}.pdf"
 
@@ -493,7 +414,6 @@ class TestProcesarPersona:
              patch("main.MODO_TEST", True), \
              patch("main.procesar_persona", side_effect=mock_procesar), \
              patch("main.async_playwright", return_value=mock_playwright):
-            from main import run
             resultados = await run()
 
         assert llamadas == ["11111111", "22222222"]